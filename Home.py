@@ -1,9 +1,10 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from utils.elk_connector import ELKConnector
+from utils.elk_connector import fetch_aggregations
+from utils.charts import apply_dark_layout
+from utils.style import inject_css
 
 # Page Config
 st.set_page_config(
@@ -14,42 +15,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    body {
-        font-family: 'Inter', sans-serif;
-        background-color: #0e1117;
-    }
-    .metric-card {
-        background-color: #1e2130;
-        border: 1px solid #2b3042;
-        padding: 15px;
-        border-radius: 8px;
-        text-align: center;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .metric-label {
-        color: #a0a0a0;
-        font-size: 0.9em;
-        margin-bottom: 5px;
-    }
-    .metric-value {
-        color: #ffffff;
-        font-size: 1.8em;
-        font-weight: bold;
-    }
-    .stPlotlyChart {
-        background-color: #1e2130;
-        border-radius: 8px;
-        padding: 10px;
-    }
-    /* Hide default header to make it look like a standalone app */
-    header {visibility: hidden;}
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize Connector
-connector = ELKConnector()
+inject_css("home.css")
 
 # Sidebar
 st.sidebar.title("Navigation")
@@ -69,9 +35,9 @@ with col_filter:
 
 # Fetch Data
 with st.spinner("Mengambil data dari ELK..."):
-    df = connector.get_data(time_range=time_range)
+    aggs = fetch_aggregations(time_range)
 
-if df.empty:
+if aggs['total'] == 0:
     st.error("Gagal mengambil data atau data kosong.")
     st.stop()
 
@@ -83,10 +49,12 @@ sectors_target = [
     "Pangan", "ESDM", "TIK", "Kesehatan", "Pertahanan", "Lainnya"
 ]
 
+sector_orgs = dict(zip(aggs['sector_orgs']['Sektor'], aggs['sector_orgs']['Count']))
+
 cols = st.columns(len(sectors_target))
 for idx, sector in enumerate(sectors_target):
-    # Filter count unique organizations in this sector
-    count = df[df['Sektor'] == sector]['Organisasi'].nunique()
+    # Unique organizations in this sector, counted by ES
+    count = sector_orgs.get(sector, 0)
     with cols[idx]:
         st.markdown(f"""
         <div class="metric-card">
@@ -100,10 +68,10 @@ st.markdown("---")
 # --- Section 2: Global KPIs ---
 kpi_c1, kpi_c2, kpi_c3, kpi_c4 = st.columns(4)
 
-total_vuln_hits = len(df)
-unique_vulns = df['Vuln'].nunique()
-unique_orgs = df['Organisasi'].nunique()
-unique_assets = df['Source'].nunique()
+total_vuln_hits = aggs['total']
+unique_vulns = aggs['unique_vulns']
+unique_orgs = aggs['unique_orgs']
+unique_assets = aggs['unique_assets']
 
 with kpi_c1:
     st.metric("Total Hit Kerentanan", f"{total_vuln_hits:,}")
@@ -118,17 +86,16 @@ with kpi_c4:
 st.markdown("### Distribusi Keparahan (Severity)")
 sev_c1, sev_c2, sev_c3, sev_c4 = st.columns(4)
 
-def get_sev_count(sev):
-    return len(df[df['Severity'] == sev])
+sev_vc = dict(zip(aggs['severity']['Severity'], aggs['severity']['Count']))
 
 with sev_c1:
-    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ff4d4f;"><div class="metric-label">CRITICAL</div><div class="metric-value">{get_sev_count("CRITICAL"):,}</div></div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ff4d4f;"><div class="metric-label">CRITICAL</div><div class="metric-value">{sev_vc.get("CRITICAL", 0):,}</div></div>', unsafe_allow_html=True)
 with sev_c2:
-    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ff7a45;"><div class="metric-label">HIGH</div><div class="metric-value">{get_sev_count("HIGH"):,}</div></div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ff7a45;"><div class="metric-label">HIGH</div><div class="metric-value">{sev_vc.get("HIGH", 0):,}</div></div>', unsafe_allow_html=True)
 with sev_c3:
-    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ffa940;"><div class="metric-label">MEDIUM</div><div class="metric-value">{get_sev_count("MEDIUM"):,}</div></div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #ffa940;"><div class="metric-label">MEDIUM</div><div class="metric-value">{sev_vc.get("MEDIUM", 0):,}</div></div>', unsafe_allow_html=True)
 with sev_c4:
-    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #73d13d;"><div class="metric-label">LOW</div><div class="metric-value">{get_sev_count("LOW"):,}</div></div>', unsafe_allow_html=True)
+    st.markdown(f'<div class="metric-card" style="border-top: 3px solid #73d13d;"><div class="metric-label">LOW</div><div class="metric-value">{sev_vc.get("LOW", 0):,}</div></div>', unsafe_allow_html=True)
 
 st.markdown("---")
 
@@ -138,24 +105,23 @@ row1_c1, row1_c2 = st.columns(2)
 # Chart 1: Persentase Vuln (Donut)
 with row1_c1:
     st.subheader("Persentase Keparahan Kerentanan")
-    sev_counts = df['Severity'].value_counts().reset_index()
-    sev_counts.columns = ['Severity', 'Count']
+    sev_counts = aggs['severity']
     color_map = {'CRITICAL': '#ff4d4f', 'HIGH': '#ff7a45', 'MEDIUM': '#ffa940', 'LOW': '#73d13d', 'UNKNOWN': '#bfbfbf'}
     
-    fig_pie = px.pie(sev_counts, values='Count', names='Severity', 
-                     color='Severity', color_discrete_map=color_map, hole=0.5)
-    fig_pie.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+    fig_pie = go.Figure(go.Pie(values=sev_counts['Count'], labels=sev_counts['Severity'], hole=0.5,
+                               marker_colors=[color_map.get(s, '#bfbfbf') for s in sev_counts['Severity']]))
+    apply_dark_layout(fig_pie)
     st.plotly_chart(fig_pie, use_container_width=True)
 
 # Chart 2: Top 10 Org Terdampak (Bar) - "Persentase Organisasi Terdampak" style
 with row1_c2:
     st.subheader("Top 10 Organisasi Terdampak (Total Hits)")
-    top_orgs = df['Organisasi'].value_counts().head(10).reset_index()
+    top_orgs = aggs['top_orgs'].head(10)
     top_orgs.columns = ['Organisasi', 'Hits']
     
-    fig_bar_org = px.bar(top_orgs, x='Hits', y='Organisasi', orientation='h', 
-                         color='Hits', color_continuous_scale='Blues')
-    fig_bar_org.update_layout(yaxis={'categoryorder':'total ascending'}, plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+    fig_bar_org = go.Figure(go.Bar(x=top_orgs['Hits'], y=top_orgs['Organisasi'], orientation='h',
+                                   marker=dict(color=top_orgs['Hits'], colorscale='Blues', showscale=True)))
+    apply_dark_layout(fig_bar_org, yaxis={'categoryorder':'total ascending', 'title': 'Organisasi'}, xaxis_title='Hits')
     st.plotly_chart(fig_bar_org, use_container_width=True)
 
 # --- Section 5: Top 5 Assets & Vulns ---
@@ -163,37 +129,39 @@ row2_c1, row2_c2 = st.columns(2)
 
 with row2_c1:
     st.subheader("Top 5 Aset Terdampak")
-    top_assets = df['Source'].value_counts().head(5).reset_index()
+    top_assets = aggs['top_assets'].head(5)
     top_assets.columns = ['Aset', 'Hits']
-    fig_asset = px.bar(top_assets, x='Aset', y='Hits', color='Hits', color_continuous_scale='Viridis')
-    fig_asset.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+    fig_asset = go.Figure(go.Bar(x=top_assets['Aset'], y=top_assets['Hits'],
+                                 marker=dict(color=top_assets['Hits'], colorscale='Viridis', showscale=True)))
+    apply_dark_layout(fig_asset, xaxis_title='Aset', yaxis_title='Hits')
     st.plotly_chart(fig_asset, use_container_width=True)
 
 with row2_c2:
     st.subheader("Top 5 Jenis Kerentanan")
-    top_vulns = df['Vuln'].value_counts().head(5).reset_index()
+    top_vulns = aggs['top_vulns'].head(5)
     top_vulns.columns = ['Vulnerability', 'Hits']
-    fig_vuln = px.bar(top_vulns, x='Vulnerability', y='Hits', color='Hits', color_continuous_scale='Magma')
-    fig_vuln.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white')
+    fig_vuln = go.Figure(go.Bar(x=top_vulns['Vulnerability'], y=top_vulns['Hits'],
+                                marker=dict(color=top_vulns['Hits'], colorscale='Magma', showscale=True)))
+    apply_dark_layout(fig_vuln, xaxis_title='Vulnerability', yaxis_title='Hits')
     st.plotly_chart(fig_vuln, use_container_width=True)
 
 # --- Section 6: CISA KEV Special Section ---
-if 'hasCisa' in df.columns and df['hasCisa'].any():
+if aggs['cisa_total'] > 0:
     st.markdown("---")
     st.subheader("⚠️ CISA Known Exploited Vulnerabilities (KEV)")
     
-    cisa_df = df[df['hasCisa'] == True]
+    cisa_df = aggs['cisa_hits']
     
     cisa_c1, cisa_c2, cisa_c3 = st.columns(3)
     with cisa_c1:
-        st.metric("Total Hit CISA KEV", f"{len(cisa_df):,}")
+        st.metric("Total Hit CISA KEV", f"{aggs['cisa_total']:,}")
     with cisa_c2:
-        st.metric("Kerentanan CISA Unik", f"{cisa_df['Vuln'].nunique():,}")
+        st.metric("Kerentanan CISA Unik", f"{aggs['cisa_unique_vulns']:,}")
     with cisa_c3:
-        st.metric("Organisasi Terdampak CISA", f"{cisa_df['Organisasi'].nunique():,}")
+        st.metric("Organisasi Terdampak CISA", f"{aggs['cisa_unique_orgs']:,}")
     
     st.dataframe(
-        cisa_df[['@timestamp', 'Vuln', 'Organisasi', 'Severity', 'Score']].head(50),
+        cisa_df[['@timestamp', 'Vuln', 'Organisasi', 'Severity', 'Score']],
         use_container_width=True,
         hide_index=True
     )
@@ -202,9 +170,11 @@ if 'hasCisa' in df.columns and df['hasCisa'].any():
 st.markdown("---")
 st.subheader("Timeline Deteksi Kerentanan")
 
-timeline_df = df.set_index('@timestamp').resample('D').size().reset_index(name='Count')
-fig_line = px.area(timeline_df, x='@timestamp', y='Count', line_shape='spline')
-fig_line.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', font_color='white', xaxis_title=None)
+# Daily buckets come pre-aggregated from the date_histogram (at most ~366 points)
+timeline_df = aggs['timeline']
+fig_line = go.Figure(go.Scatter(x=timeline_df['@timestamp'], y=timeline_df['Count'],
+                                mode='lines', fill='tozeroy', line_shape='spline'))
+apply_dark_layout(fig_line, xaxis_title=None, yaxis_title='Count')
 st.plotly_chart(fig_line, use_container_width=True)
 
 st.markdown("---")
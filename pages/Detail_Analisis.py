@@ -1,9 +1,12 @@
 
+import io
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
-from utils.elk_connector import ELKConnector
+from utils.elk_connector import fetch_data, DEFAULT_FIELDS
+from utils.charts import apply_dark_layout
+from utils.style import inject_css
 
 # Custom Logic for Detail Analysis
 st.set_page_config(
@@ -12,44 +15,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Reuse Styles (Ideally in a shared file, but replicating for simplicity as per single-file logic constraints sometimes)
-st.markdown("""
-<style>
-    /* Global Styles */
-    body {
-        font-family: 'Inter', sans-serif;
-        background-color: #0e1117;
-        color: #e0e0e0;
-    }
-    
-    /* Metrics Cards */
-    div[data-testid="metric-container"] {
-        background-color: rgba(28, 31, 46, 0.7);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        border-radius: 10px;
-        padding: 15px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.3);
-        backdrop-filter: blur(10px);
-    }
-    
-    /* Table headers */
-    thead tr th:first-child {display:none}
-    tbody th {display:none}
-    
-    .stDataFrame {
-        border-radius: 10px;
-        overflow: hidden;
-        border: 1px solid rgba(255,255,255,0.1);
-    }
-
-    /* Plotly */
-    .js-plotly-plot .plotly .main-svg {
-        background: transparent !important;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-connector = ELKConnector()
+# Shared styles plus the detail page rules
+inject_css("detail.css")
 
 st.title("🔬 Advanced Threat Analysis")
 st.markdown("Deep dive into vulnerability logs, filter by specific attributes, and identify patterns.")
@@ -60,16 +27,16 @@ time_range = st.sidebar.selectbox("Base Time Range", ["30d", "90d", "1y"], index
 
 # Fetch base data
 with st.spinner("Loading Data..."):
-    df = connector.get_data(time_range=time_range)
+    df = fetch_data(time_range, fields=DEFAULT_FIELDS + ("Target",))
 
 if df.empty:
     st.error("No data available.")
     st.stop()
 
-# Dynamic Filters based on data
-all_sectors = sorted(df['Sektor'].unique().tolist())
-all_severs = sorted(df['Severity'].unique().tolist())
-all_orgs = sorted(df['Organisasi'].unique().tolist())
+# Dynamic Filters based on data (categories are already unique and sorted)
+all_sectors = df['Sektor'].cat.categories.tolist()
+all_severs = df['Severity'].cat.categories.tolist()
+all_orgs = df['Organisasi'].cat.categories.tolist()
 
 col_f1, col_f2, col_f3 = st.sidebar.columns(3) # Not sidebar columns, sidebar widgets are stacked.
 
@@ -78,13 +45,25 @@ selected_severities = st.sidebar.multiselect("Filter by Severity", all_severs, d
 selected_orgs = st.sidebar.multiselect("Filter by Organization", all_orgs, default=[])
 
 # Apply Filters
-filtered_df = df[
-    (df['Sektor'].isin(selected_sectors)) & 
-    (df['Severity'].isin(selected_severities))
-]
-
+def category_mask(series, selected):
+    """Boolean mask of rows whose category is in selected, compared on integer codes"""
+    codes = series.cat.categories.get_indexer(selected)
+    return np.isin(series.cat.codes.to_numpy(), codes[codes >= 0])
+
+# A selection covering every option matches all rows, so skip its mask entirely
+mask = None
+for column, selected, options in [
+    ('Sektor', selected_sectors, all_sectors),
+    ('Severity', selected_severities, all_severs),
+]:
+    if len(selected) < len(options):
+        m = category_mask(df[column], selected)
+        mask = m if mask is None else mask & m
 if selected_orgs:
-    filtered_df = filtered_df[filtered_df['Organisasi'].isin(selected_orgs)]
+    m = category_mask(df['Organisasi'], selected_orgs)
+    mask = m if mask is None else mask & m
+
+filtered_df = df if mask is None else df[mask]
 
 st.markdown(f"### Analysis View ({len(filtered_df)} records)")
 
@@ -93,37 +72,41 @@ c1, c2 = st.columns(2)
 
 with c1:
     st.subheader("Severity vs. Sector Correlation")
-    # Pivot table for heatmap
-    heatmap_data = filtered_df.groupby(['Sektor', 'Severity']).size().reset_index(name='Count')
-    heatmap_pivot = heatmap_data.pivot(index='Sektor', columns='Severity', values='Count').fillna(0)
+    # Pivot table for heatmap (drop unused sectors so filtered-out rows don't show up as zeros)
+    heatmap_pivot = pd.crosstab(filtered_df['Sektor'].cat.remove_unused_categories(), filtered_df['Severity'])
     
     # Sort columns by severity logic
     severity_order = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
-    heatmap_pivot = heatmap_pivot.reindex(columns=[c for c in severity_order if c in heatmap_pivot.columns], fill_value=0)
+    present_severities = set(filtered_df['Severity'].unique())
+    heatmap_pivot = heatmap_pivot.reindex(columns=[c for c in severity_order if c in present_severities], fill_value=0)
     
-    fig_heat = px.imshow(heatmap_pivot, 
-                         color_continuous_scale='Reds',
-                         aspect='auto',
-                         text_auto=True,
-                         title="Heatmap: Sektor x Severity Analysis")
-    fig_heat.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
+    fig_heat = go.Figure(go.Heatmap(z=heatmap_pivot.values,
+                                    x=heatmap_pivot.columns.tolist(),
+                                    y=heatmap_pivot.index.tolist(),
+                                    colorscale='Reds',
+                                    texttemplate='%{z}'))
+    apply_dark_layout(
+        fig_heat,
         font_color='#e0e0e0',
+        title="Heatmap: Sektor x Severity Analysis",
+        xaxis_title='Severity',
+        yaxis=dict(title='Sektor', autorange='reversed'),
     )
     st.plotly_chart(fig_heat, use_container_width=True)
 
 with c2:
     st.subheader("Vulnerability Score Distribution")
     # Box plot of scores by Sector
-    fig_box = px.box(filtered_df, x='Sektor', y='Score', 
-                     title="CVSS Score Distribution by Sector",
-                     color='Sektor',
-                     points='outliers') # minimal points
-    fig_box.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
+    fig_box = go.Figure()
+    for sector, scores in filtered_df.groupby('Sektor', observed=True)['Score']:
+        # boxpoints=False: outlier markers dominate render time
+        fig_box.add_trace(go.Box(y=scores.to_numpy(), name=sector, boxpoints=False))
+    apply_dark_layout(
+        fig_box,
         font_color='#e0e0e0',
+        title="CVSS Score Distribution by Sector",
+        xaxis_title='Sektor',
+        yaxis_title='Score',
         showlegend=False
     )
     st.plotly_chart(fig_box, use_container_width=True)
@@ -144,7 +127,15 @@ st.dataframe(
 )
 
 # Download Button
-csv = filtered_df.to_csv(index=False).encode('utf-8')
+# Cached on the frame's content hash so unrelated reruns skip serialization
+@st.cache_data(max_entries=10, show_spinner=False)
+def to_csv_bytes(frame):
+    """Serializes frame to UTF-8 CSV bytes, writing straight into a byte buffer without an intermediate str copy"""
+    buf = io.BytesIO()
+    frame.to_csv(buf, index=False, encoding='utf-8')
+    return buf.getvalue()
+
+csv = to_csv_bytes(filtered_df)
 st.download_button(
     "Download Filtered Data (CSV)",
     csv,
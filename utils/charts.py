@@ -0,0 +1,7 @@
+
+TRANSPARENT = 'rgba(0,0,0,0)'
+
+def apply_dark_layout(fig, font_color='white', **layout):
+    """Applies the dashboard's transparent dark theme to a plotly figure"""
+    fig.update_layout(plot_bgcolor=TRANSPARENT, paper_bgcolor=TRANSPARENT, font_color=font_color, **layout)
+    return fig
@@ -1,12 +1,31 @@
 
 import os
 import streamlit as st
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
+from elasticsearch.serializer import JSONSerializer
 from datetime import datetime, timedelta
 import pandas as pd
-import random
+import numpy as np
 from dotenv import load_dotenv
 
+try:
+    # Only swaps json_dumps/json_loads, keeping the transport's empty-body,
+    # str passthrough and SerializationError handling
+    from elasticsearch.serializer import OrjsonSerializer
+except ImportError:
+    try:
+        import orjson
+    except ImportError:
+        OrjsonSerializer = None
+    else:
+        class OrjsonSerializer(JSONSerializer):
+            """Fallback for clients that predate the bundled OrjsonSerializer"""
+            def json_dumps(self, data):
+                return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+            def json_loads(self, data):
+                return orjson.loads(data)
+
 load_dotenv()
 
 ES_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
@@ -14,25 +33,100 @@ ES_USER = os.getenv("ELASTICSEARCH_USER", "elastic")
 ES_PASS = os.getenv("ELASTICSEARCH_PASSWORD", "changeme")
 ES_INDEX = os.getenv("ELASTICSEARCH_INDEX", "nasional_cve*")
 
+# Time ranges fetched via the scroll API instead of a single search
+SCAN_RANGES = ["1y", "All"]
+# Columns returned by get_data unless the caller asks for a different set
+DEFAULT_FIELDS = ("@timestamp", "Severity", "Sektor", "Organisasi", "Vuln", "Source", "Score", "hasCisa")
+# Columns shown in the CISA KEV table on the overview page
+CISA_FIELDS = ("@timestamp", "Vuln", "Organisasi", "Severity", "Score")
+# Repeatedly filtered/grouped columns, kept as category dtype
+CATEGORY_COLUMNS = ["Severity", "Sektor", "Organisasi", "Vuln", "Source", "Target"]
+# Bucket count for the top-N terms aggregations
+AGG_TOP_N = 10
+CARDINALITY_PRECISION = 40000
+CISA_TABLE_SIZE = 50
+
+def _sources_to_frame(sources, fields=DEFAULT_FIELDS):
+    """Flattens ES _source dicts into the dashboard DataFrame layout"""
+    if not sources:
+        return pd.DataFrame()
+
+    raw = pd.json_normalize(sources)
+    df = pd.DataFrame(index=raw.index)
+    for field in fields:
+        if field == '@timestamp':
+            df[field] = pd.to_datetime(raw.get(field), format='ISO8601', utc=True, cache=True)
+        elif field == 'Score':
+            df[field] = raw.get(field, pd.Series(index=raw.index, dtype=float)).fillna(0)
+        elif field == 'hasCisa':
+            df[field] = raw.get(field, pd.Series(index=raw.index, dtype=object)).fillna(False).astype(bool)
+        else:
+            df[field] = raw.get(field, pd.Series(index=raw.index, dtype=object)).fillna("UNKNOWN")
+    return _as_categories(df)
+
+def _as_categories(df):
+    """Casts the low-cardinality string columns to category dtype"""
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    return df
+
+def _aggregate_frame(df):
+    """Computes the get_aggregations result locally from a raw DataFrame"""
+    def top(column):
+        return df[column].value_counts().head(AGG_TOP_N).rename_axis(column).reset_index(name='Count')
+
+    cisa_mask = df['hasCisa'].to_numpy(dtype=bool)
+    cisa_df = df[cisa_mask]
+    return {
+        "total": len(df),
+        "unique_vulns": df['Vuln'].nunique(),
+        "unique_orgs": df['Organisasi'].nunique(),
+        "unique_assets": df['Source'].nunique(),
+        "severity": df['Severity'].value_counts().rename_axis('Severity').reset_index(name='Count'),
+        "top_orgs": top('Organisasi'),
+        "top_vulns": top('Vuln'),
+        "top_assets": top('Source'),
+        # unique().apply(len) is cheaper than nunique() on a groupby
+        "sector_orgs": df.groupby('Sektor', observed=True)['Organisasi'].unique().apply(len).reset_index(name='Count'),
+        "timeline": df.set_index('@timestamp').resample('D').size().reset_index(name='Count'),
+        "cisa_total": int(cisa_mask.sum()),
+        "cisa_unique_vulns": cisa_df['Vuln'].nunique(),
+        "cisa_unique_orgs": cisa_df['Organisasi'].nunique(),
+        "cisa_hits": cisa_df.sort_values('@timestamp', ascending=False).head(CISA_TABLE_SIZE)[list(CISA_FIELDS)]
+    }
+
+@st.cache_resource
+def _get_es_client():
+    extra = {"serializer": OrjsonSerializer()} if OrjsonSerializer is not None else {}
+    return Elasticsearch(
+        ES_URL,
+        basic_auth=(ES_USER, ES_PASS),
+        verify_certs=False,
+        request_timeout=30,
+        **extra
+    )
+
 class ELKConnector:
     def __init__(self):
         try:
-            self.es = Elasticsearch(
-                ES_URL,
-                basic_auth=(ES_USER, ES_PASS),
-                verify_certs=False,
-                request_timeout=30
-            )
-            self.connected = self.es.ping()
+            self.es = _get_es_client()
         except Exception as e:
             print(f"Connection failed: {e}")
-            self.connected = False
+            self.es = None
 
-    def get_data(self, time_range="30d"):
-        if not self.connected:
-            return self._generate_mock_data()
-        
-        # Calculate time range
+    def health(self):
+        """Pings the cluster, returning False when it is unreachable"""
+        if self.es is None:
+            return False
+        try:
+            return self.es.ping()
+        except Exception as e:
+            print(f"Connection failed: {e}")
+            return False
+
+    def _range_query(self, time_range):
+        """Builds the @timestamp range filter for the given time_range"""
         end_date = datetime.now()
         if time_range == "7d":
             start_date = end_date - timedelta(days=7)
@@ -43,69 +137,147 @@ class ELKConnector:
         else:
             start_date = end_date - timedelta(days=365)
 
-        query = {
-            "size": 10000, 
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "@timestamp": {
-                                    "gte": start_date.isoformat(),
-                                    "lte": end_date.isoformat()
-                                }
+        return {
+            "bool": {
+                "must": [
+                    {
+                        "range": {
+                            "@timestamp": {
+                                "gte": start_date.isoformat(),
+                                "lte": end_date.isoformat()
                             }
                         }
-                    ]
-                }
-            },
-            "_source": [
-                "@timestamp", 
-                "Severity.keyword", 
-                "Sektor.keyword", 
-                "Organisasi.keyword", 
-                "Vuln.keyword", 
-                "Source.keyword", 
-                "Target.keyword", 
-                "Score",
-                "hasCisa",
-                "IPAddresses.keyword"
-            ]
+                    }
+                ]
+            }
+        }
+
+    def get_data(self, time_range="30d", fields=DEFAULT_FIELDS):
+        if not self.health():
+            return self._generate_mock_data()[list(fields)]
+
+        query = {
+            "query": self._range_query(time_range),
+            # .keyword is an index multi-field, not a stored key, so filter on the source paths
+            "_source": list(fields)
         }
 
         try:
-            resp = self.es.search(index=ES_INDEX, body=query)
-            hits = resp['hits']['hits']
-            data = []
-            for hit in hits:
-                source = hit['_source']
-                # Helper to get keyword field or fall back to text field
-                def get_val(field):
-                    return source.get(f"{field}.keyword", source.get(field, "UNKNOWN"))
-
-                flat_data = {
-                    "@timestamp": source.get("@timestamp"),
-                    "Severity": get_val("Severity"),
-                    "Sektor": get_val("Sektor"),
-                    "Organisasi": get_val("Organisasi"),
-                    "Vuln": get_val("Vuln"),
-                    "Source": get_val("Source"),
-                    "Target": get_val("Target"),
-                    "Score": source.get("Score", 0),
-                    "hasCisa": source.get("hasCisa", False),
-                    "IPAddresses": get_val("IPAddresses")
-                }
-                data.append(flat_data)
-            
-            df = pd.DataFrame(data)
-            if not df.empty:
-                df['@timestamp'] = pd.to_datetime(df['@timestamp'])
-            return df
+            sources = self._fetch_sources(query, time_range)
+            return _sources_to_frame(sources, fields)
         
         except Exception as e:
             # st.error(f"Error fetching data: {e}") # Suppress error in production look
             print(f"Error fetching data from ELK: {e}")
-            return self._generate_mock_data()
+            return self._generate_mock_data()[list(fields)]
+
+    def get_aggregations(self, time_range="30d"):
+        """Computes the overview metrics server-side instead of pulling raw hits"""
+        if not self.health():
+            return _aggregate_frame(self._generate_mock_data())
+
+        def terms(field, size=AGG_TOP_N):
+            return {"terms": {"field": f"{field}.keyword", "missing": "UNKNOWN", "size": size}}
+
+        def cardinality(field):
+            # 40000 is the maximum precision_threshold: counts stay exact up to it
+            return {"cardinality": {"field": f"{field}.keyword", "missing": "UNKNOWN",
+                                    "precision_threshold": CARDINALITY_PRECISION}}
+
+        query = {
+            "size": 0,
+            "track_total_hits": True,
+            "query": self._range_query(time_range),
+            "aggs": {
+                "severity": terms("Severity"),
+                "top_orgs": terms("Organisasi"),
+                "top_vulns": terms("Vuln"),
+                "top_assets": terms("Source"),
+                "unique_vulns": cardinality("Vuln"),
+                "unique_orgs": cardinality("Organisasi"),
+                "unique_assets": cardinality("Source"),
+                "sectors": {
+                    **terms("Sektor", size=100),
+                    "aggs": {"orgs": cardinality("Organisasi")}
+                },
+                "timeline": {
+                    "date_histogram": {"field": "@timestamp", "calendar_interval": "day"}
+                },
+                "cisa": {
+                    "filter": {"term": {"hasCisa": True}},
+                    "aggs": {
+                        "unique_vulns": cardinality("Vuln"),
+                        "unique_orgs": cardinality("Organisasi"),
+                        "latest": {
+                            "top_hits": {
+                                "size": CISA_TABLE_SIZE,
+                                "sort": [{"@timestamp": {"order": "desc"}}],
+                                "_source": list(CISA_FIELDS)
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        try:
+            resp = self.es.search(index=ES_INDEX, body=query)
+            aggs = resp['aggregations']
+
+            def buckets(name, column):
+                rows = [(b['key'], b['doc_count']) for b in aggs[name]['buckets']]
+                return pd.DataFrame(rows, columns=[column, 'Count'])
+
+            sector_orgs = pd.DataFrame(
+                [(b['key'], b['orgs']['value']) for b in aggs['sectors']['buckets']],
+                columns=['Sektor', 'Count']
+            )
+            timeline = buckets('timeline', '@timestamp')
+            timeline['@timestamp'] = pd.to_datetime(timeline['@timestamp'], unit='ms', utc=True)
+            cisa = aggs['cisa']
+
+            return {
+                "total": resp['hits']['total']['value'],
+                "unique_vulns": aggs['unique_vulns']['value'],
+                "unique_orgs": aggs['unique_orgs']['value'],
+                "unique_assets": aggs['unique_assets']['value'],
+                "severity": buckets('severity', 'Severity'),
+                "top_orgs": buckets('top_orgs', 'Organisasi'),
+                "top_vulns": buckets('top_vulns', 'Vuln'),
+                "top_assets": buckets('top_assets', 'Source'),
+                "sector_orgs": sector_orgs,
+                "timeline": timeline,
+                "cisa_total": cisa['doc_count'],
+                "cisa_unique_vulns": cisa['unique_vulns']['value'],
+                "cisa_unique_orgs": cisa['unique_orgs']['value'],
+                "cisa_hits": _sources_to_frame([h['_source'] for h in cisa['latest']['hits']['hits']], CISA_FIELDS)
+            }
+
+        except Exception as e:
+            print(f"Error fetching aggregations from ELK: {e}")
+            return _aggregate_frame(self._generate_mock_data())
+
+    def _fetch_sources(self, query, time_range):
+        """Returns the _source dicts of all hits matching query"""
+        if time_range in SCAN_RANGES:
+            # Long ranges can exceed the 10k search window, so scroll through them
+            hits = helpers.scan(
+                self.es,
+                index=ES_INDEX,
+                query=query,
+                size=5000,
+                scroll="2m",
+                preserve_order=False
+            )
+            return [hit['_source'] for hit in hits]
+
+        resp = self.es.search(
+            index=ES_INDEX,
+            body={**query, "size": 10000, "track_total_hits": False},
+            filter_path=["hits.hits._source"]
+        )
+        # filter_path drops the "hits" key entirely when nothing matched
+        return [hit['_source'] for hit in resp.get('hits', {}).get('hits', [])]
 
     def _generate_mock_data(self):
         """Generates realistic mock data based on export.ndjson schema"""
@@ -126,28 +298,37 @@ class ELKConnector:
             "CVE-2023-23397", "CVE-2024-3400", "CVE-2023-4966 (Citrix Bleed)"
         ]
         
-        data = []
-        now = datetime.now()
-        for _ in range(1000):
-            sector = random.choice(sectors)
-            # Correlate org with sector roughly
-            org = random.choice(orgs)
-            
-            sev = random.choices(severities, weights=[0.1, 0.2, 0.4, 0.3])[0]
-            
-            data.append({
-                "@timestamp": now - timedelta(days=random.randint(0, 90)),
-                "Severity": sev,
-                "Sektor": sector,
-                "Organisasi": org,
-                "Vuln": random.choice(vulns),
-                "Source": f"10.10.{random.randint(1, 255)}.{random.randint(1, 255)}",
-                "Target": f"web-server-{random.randint(1, 20)}",
-                "Score": round(random.uniform(4.0, 10.0), 1),
-                "hasCisa": random.choice([True, False]),
-                "IPAddresses": f"192.168.1.{random.randint(1, 255)}"
-            })
-        return pd.DataFrame(data)
+        rng = np.random.default_rng()
+        n = 1000
+        now = pd.Timestamp(datetime.now())
+
+        def octets(low, high):
+            return pd.Series(rng.integers(low, high + 1, n)).astype(str)
+
+        data = {
+            "@timestamp": now - pd.to_timedelta(rng.integers(0, 91, n), unit='D'),
+            "Severity": rng.choice(severities, size=n, p=[0.1, 0.2, 0.4, 0.3]),
+            "Sektor": rng.choice(sectors, size=n),
+            "Organisasi": rng.choice(orgs, size=n),
+            "Vuln": rng.choice(vulns, size=n),
+            "Source": "10.10." + octets(1, 255) + "." + octets(1, 255),
+            "Target": "web-server-" + octets(1, 20),
+            "Score": np.round(rng.uniform(4.0, 10.0, n), 1),
+            "hasCisa": rng.integers(0, 2, n).astype(bool)
+        }
+        return _as_categories(pd.DataFrame(data))
 
+@st.cache_resource
 def get_connector():
     return ELKConnector()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_data(time_range="30d", fields=DEFAULT_FIELDS):
+    """Cached wrapper around ELKConnector.get_data, keyed on time_range and fields.
+    The returned DataFrame is shared across reruns; callers must not mutate it."""
+    return get_connector().get_data(time_range=time_range, fields=tuple(fields))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_aggregations(time_range="30d"):
+    """Cached wrapper around ELKConnector.get_aggregations, keyed on time_range"""
+    return get_connector().get_aggregations(time_range=time_range)
@@ -0,0 +1,17 @@
+
+import os
+import streamlit as st
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "assets")
+
+@st.cache_data
+def _load_css(name):
+    with open(os.path.join(ASSETS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def inject_css(page_stylesheet=None):
+    """Injects the shared dashboard stylesheet followed by the page's own rules"""
+    css = _load_css("style.css")
+    if page_stylesheet:
+        css += _load_css(page_stylesheet)
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)